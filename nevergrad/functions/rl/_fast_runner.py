@@ -0,0 +1,67 @@
+"""Compiled episode loop for small state-machine environments.
+Environments can opt in by implementing a _numba_tables method (see DoubleOSeven),
+and agents by implementing a _numba_policy method (see RandomAgent and Agent007).
+"""
+from typing import Any, Callable
+import numpy as np
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:  # numba is optional, the functions below then run as pure Python
+    NUMBA_AVAILABLE = False
+
+    def njit(*args: Any, **kwargs: Any) -> Any:  # type: ignore
+        if len(args) == 1 and callable(args[0]):  # used as @njit
+            return args[0]
+        return lambda func: func
+
+
+@njit  # type: ignore
+def run_episodes(  # pylint: disable=too-many-arguments
+    transition: Callable[[np.ndarray, np.ndarray, np.ndarray], bool],
+    encode: Callable[[np.ndarray, int], int],
+    initial_state: np.ndarray,
+    cumulated_policies: np.ndarray,
+    max_step: float,
+    num_episodes: int,
+    seed: int,
+) -> np.ndarray:
+    """Plays several episodes and returns the sum of the rewards of each agent.
+    This function takes compiled functions as arguments, so it cannot be cached on disk: it is compiled
+    at its first call in each process (which takes about a second), and is then fast for the same environment.
+
+    Parameters
+    ----------
+    transition: callable
+        compiled function updating the state in place given the actions, filling the
+        rewards array and returning whether the episode is over
+    encode: callable
+        compiled function returning the index of the observation of an agent (given its index)
+    initial_state: np.ndarray
+        state of the environment at the beginning of an episode
+    cumulated_policies: np.ndarray
+        cumulated action probabilities, with shape (number of agents, number of encoded observations, number of actions)
+    max_step: float
+        maximum number of steps in an episode
+    num_episodes: int
+        number of episodes to play
+    seed: int
+        seed of the random state (compiled functions do not use numpy's global random state)
+    """
+    np.random.seed(seed)
+    num_agents = cumulated_policies.shape[0]
+    reward_sum = np.zeros(num_agents)
+    rewards = np.zeros(num_agents)
+    actions = np.zeros(num_agents, dtype=np.int64)
+    for _ in range(num_episodes):
+        state = initial_state.copy()
+        step = 0
+        done = False
+        while step < max_step and not done:
+            for k in range(num_agents):
+                cumulated = cumulated_policies[k, encode(state, k)]
+                actions[k] = np.searchsorted(cumulated, np.random.random() * cumulated[-1], side="right")
+            done = transition(state, actions, rewards)
+            reward_sum += rewards
+            step += 1
+    return reward_sum
@@ -1,7 +1,7 @@
 import warnings
 import operator
 import copy as _copy
-from typing import Dict, Any, Optional, Callable, Tuple
+from typing import Dict, Any, Optional, Callable, Tuple, Sequence, List
 import gym
 import numpy as np
 import torch
@@ -26,6 +26,11 @@ class RandomAgent(base.Agent):
     def act(self, observation: Any, reward: Any, done: bool, info: Optional[Dict[Any, Any]] = None) -> Any:
         return np.random.randint(self.num_outputs)
 
+    def _numba_policy(self, observations: np.ndarray) -> np.ndarray:
+        """Action probabilities for each observation (for the compiled fast path of the EnvironmentRunner)
+        """
+        return np.full((observations.shape[0], self.num_outputs), 1.0 / self.num_outputs)
+
     def copy(self) -> "RandomAgent":
         return self.__class__(self.env)
 
@@ -48,6 +53,15 @@ class Agent007(base.Agent):
             action = np.random.choice(["fire", "protect", "reload"])
         return envs.JamesBond.actions.index(action)
 
+    def _numba_policy(self, observations: np.ndarray) -> np.ndarray:
+        """Action probabilities for each observation (for the compiled fast path of the EnvironmentRunner)
+        """
+        probas = np.full((observations.shape[0], 3), 1.0 / 3)
+        my_amm, _, their_amm, their_prot = observations.T
+        probas[their_amm == 0] = [0.5, 0, 0.5]
+        probas[(their_prot == 4) & (my_amm > 0)] = [1, 0, 0]
+        return probas
+
     def copy(self) -> "Agent007":
         return self.__class__(self.env)
 
@@ -84,6 +98,18 @@ class TorchAgent(base.Agent):
         else:
             return next(iter(WeightedRandomSampler(probas, 1)))
 
+    def act_batch(
+        self, observations: Sequence[Any], rewards: Sequence[Any], dones: Sequence[bool], infos: Sequence[Optional[Dict[Any, Any]]]
+    ) -> List[Any]:
+        obs = torch.from_numpy(np.asarray(observations, dtype=np.float32))
+        probas = F.softmax(self.module.forward(obs), dim=1)
+        if self.deterministic:
+            return probas.argmax(1).tolist()  # type: ignore
+        return [next(iter(WeightedRandomSampler(p, 1))) for p in probas]
+
+    def seed(self, seed: int) -> None:
+        torch.manual_seed(seed)  # used by the sampling of non-deterministic agents
+
     def copy(self) -> "TorchAgent":
         return TorchAgent(_copy.deepcopy(self.module), self.deterministic)
 
@@ -1,55 +1,176 @@
-from typing import Any, Optional, Dict, Iterable, Tuple, List, Union
-from collections import defaultdict
+import random
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Optional, Dict, Iterable, Tuple, List, Union, Sequence, Deque, ClassVar
 import gym
+import numpy as np
+from . import _fast_runner
 
 
-StepReturn = Tuple[Dict[str, Any], Dict[str, int], Dict[str, bool], Dict[str, Any]]  # ray-like multi-agent return type
+_SINGLE_AGENT_NAME = "single_agent_name"
+# ray-like multi-agent return type, with the global done flag as an additional boolean instead of a "__all__" key
+StepReturn = Tuple[Dict[str, Any], Dict[str, int], Dict[str, bool], Dict[str, Any], bool]
 
 
 class StepOutcome:
-    """Handle for dealing with environment (and especially multi-agent) outputs more easily
+    """Handle for dealing with environment (and especially multi-agent) outputs more easily.
+    Outcomes must only be modified through the update method (which is used to reuse them
+    instead of allocating new ones at each step).
     """
 
+    __slots__ = ("observation", "reward", "done", "info", "_tuple")
+
     def __init__(self, observation: Any, reward: Any = None, done: bool = False, info: Optional[Dict[Any, Any]] = None) -> None:
         self.observation = observation
         self.reward = reward
         self.done = done
         self.info: Dict[Any, Any] = {} if info is None else info
+        self._tuple = (observation, reward, done, self.info)  # precomputed for agent.act(*outcome)
+
+    def update(self, observation: Any, reward: Any = None, done: bool = False, info: Optional[Dict[Any, Any]] = None) -> None:
+        """Overwrites the outcome in place
+        """
+        self.observation = observation
+        self.reward = reward
+        self.done = done
+        self.info = {} if info is None else info
+        self._tuple = (observation, reward, done, self.info)
 
     def __iter__(self) -> Iterable[Any]:
-        return iter((self.observation, self.reward, self.done, self.info))
+        return iter(self._tuple)
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(observation={self.observation}, reward={self.reward}, done={self.done}, info={self.info})"
 
     @classmethod
-    def from_multiagent_step(
-        cls, obs: Dict[str, Any], reward: Dict[str, Any], done: Dict[str, bool], info: Dict[str, Dict[Any, Any]]
+    def from_multiagent_step(  # pylint: disable=too-many-arguments
+        cls,
+        obs: Dict[str, Any],
+        reward: Dict[str, Any],
+        done: Dict[str, bool],
+        info: Dict[str, Dict[Any, Any]],
+        done_all: bool = False,
+        keys: Optional[Iterable[str]] = None,
+        pool: Optional[Dict[str, "StepOutcome"]] = None,
     ) -> Tuple[Dict[str, "StepOutcome"], bool]:
-        outcomes = {
-            agent: cls(obs[agent], reward.get(agent, None), done.get(agent, done.get("__all__", False)), info.get(agent, {}))
-            for agent in obs
-        }
-        return outcomes, done.get("__all__", False)
+        """Converts ray-like multi-agent step returns into StepOutcome instances
+
+        Parameters
+        ----------
+        done_all: bool
+            whether the environment is done (and default done value for agents missing from done)
+        keys: iterable of str (optional)
+            names of the agents to convert (defaults to all agents with an observation)
+        pool: dict (optional)
+            dict to fill with the outcomes, in which existing outcomes are updated in place instead
+            of being reallocated (a new dict is created if not provided). Outcomes of agents without
+            observation are removed from it, unless keys are provided.
+
+        Returns
+        -------
+        dict:
+            the outcome of each agent
+        bool:
+            whether the environment is done
+        """
+        if pool is None:
+            pool = {}
+        elif keys is None and pool.keys() != obs.keys():  # comparing the views does not allocate any set
+            for agent in pool.keys() - obs.keys():
+                del pool[agent]
+        for agent in obs if keys is None else keys:
+            outcome = pool.get(agent, None)
+            if outcome is None:
+                pool[agent] = cls(obs[agent], reward.get(agent, None), done.get(agent, done_all), info.get(agent, {}))
+            else:
+                outcome.update(obs[agent], reward.get(agent, None), done.get(agent, done_all), info.get(agent, {}))
+        return pool, done_all
 
     @staticmethod
     def to_multiagent_step(outcomes: Dict[str, "StepOutcome"], done: bool = False) -> StepReturn:
-        names = ["observation", "reward", "done", "info"]
-        obs, reward, done_dict, info = ({agent: getattr(outcome, name) for agent, outcome in outcomes.items()} for name in names)
-        done_dict["__all__"] = done
-        return obs, reward, done_dict, info
+        obs: Dict[str, Any] = {}
+        reward: Dict[str, Any] = {}
+        done_dict: Dict[str, bool] = {}
+        info: Dict[str, Any] = {}
+        for agent, outcome in outcomes.items():
+            obs[agent] = outcome.observation
+            reward[agent] = outcome.reward
+            done_dict[agent] = outcome.done
+            info[agent] = outcome.info
+        return obs, reward, done_dict, info, done
+
+
+class SoAStepBatch:
+    """Structure-of-arrays outcomes of a fixed set of agents sharing the same array observations
+    (as in most multi-agent environments, see MultiAgentEnv). Arrays are indexed by the position
+    of the agent in names, and are overwritten in place at each conversion.
+
+    Parameters
+    ----------
+    names: tuple of str
+        names of the agents, which must all play at each step
+    observation_space: gym.spaces.Box
+        the observation space shared by all agents
+    """
+
+    __slots__ = ("names", "observation", "reward", "done", "info")
+
+    def __init__(self, names: Tuple[str, ...], observation_space: gym.spaces.Box) -> None:
+        self.names = names
+        self.observation = np.zeros((len(names),) + observation_space.shape, dtype=observation_space.dtype)
+        self.reward = np.zeros(len(names))
+        self.done = np.zeros(len(names), dtype=bool)
+        self.info: List[Dict[Any, Any]] = [{} for _ in names]
+
+    def from_multiagent_step(
+        self, obs: Dict[str, Any], reward: Dict[str, Any], done: Dict[str, bool], info: Dict[str, Dict[Any, Any]], done_all: bool = False
+    ) -> bool:
+        """Fills the arrays with ray-like multi-agent step returns (see StepOutcome.from_multiagent_step),
+        and returns whether the environment is done
+        """
+        if len(obs) != len(self.names):
+            raise RuntimeError(f"All agents {self.names} must play at each step, but got observations for {list(obs)}")
+        for k, name in enumerate(self.names):
+            self.observation[k] = obs[name]
+            self.reward[k] = reward.get(name, 0)
+            self.done[k] = done.get(name, done_all)
+            self.info[k] = info.get(name, {})
+        return done_all
+
+    def to_multiagent_step(self, done: bool = False) -> StepReturn:
+        """Converts the arrays to ray-like multi-agent step returns (see StepOutcome.to_multiagent_step)
+        """
+        names = self.names
+        reward: Dict[str, Any] = dict(zip(names, self.reward.tolist()))
+        return dict(zip(names, self.observation)), reward, dict(zip(names, self.done.tolist())), dict(zip(names, self.info)), done
 
 
 class Agent:
     """Base class for an Agent operating in an environment.
     """
 
+    # whether act must also be called on the final outcome of an episode (eg: for learning agents)
+    needs_terminal_observation: ClassVar[bool] = False
+
     def act(self, observation: Any, reward: Any, done: bool, info: Optional[Dict[Any, Any]] = None) -> Any:
         raise NotImplementedError
 
+    def act_batch(
+        self, observations: Sequence[Any], rewards: Sequence[Any], dones: Sequence[bool], infos: Sequence[Optional[Dict[Any, Any]]]
+    ) -> List[Any]:
+        """Acts on a batch of outcomes (one per copy of the environment).
+        Override it if the agent can process a batch more efficiently than one outcome at a time.
+        """
+        return [self.act(*args) for args in zip(observations, rewards, dones, infos)]
+
     def reset(self) -> None:
         pass
 
+    def seed(self, seed: int) -> None:
+        """Seeds the random generators of the agent which are not numpy's and random's global ones (eg: torch)
+        """
+
     def copy(self) -> "Agent":
         return self.__class__()
 
@@ -69,6 +190,7 @@ class MultiAgentEnv:
         """Returns observations from ready agents.
         The returns are dicts mapping from agent_id strings to StepOutcome. The
         number of agents in the env can vary over time.
+        The last returned element is a boolean specifying whether the environment is done.
         """
         raise NotImplementedError
 
@@ -95,29 +217,70 @@ class PartialMultiAgentEnv(MultiAgentEnv):
         self.agent_names = [an for an in env.agent_names if an not in agents]
         self.observation_space = env.observation_space
         self.action_space = env.action_space
+        self._agent_keys = tuple(self.agents)
+        self._other_keys = tuple(self.agent_names)
         self._agents_outcome: Dict[str, StepOutcome] = {}
 
     def reset(self) -> Dict[str, Any]:
-        outcomes = StepOutcome.from_multiagent_step(self.env.reset(), {}, {}, {})[0]
-        self._agents_outcome = {name: outcomes[name] for name in self.agents}
-        return {name: outcomes[name].observation for name in outcomes if name not in self.agents}
+        obs = self.env.reset()
+        StepOutcome.from_multiagent_step(obs, {}, {}, {}, keys=self._agent_keys, pool=self._agents_outcome)
+        return {name: obs[name] for name in self._other_keys if name in obs}
 
     def step(self, action_dict: Dict[str, Any]) -> StepReturn:
         """Returns observations from ready agents.
         The returns are dicts mapping from agent_id strings to StepOutcome. The
         number of agents in the env can vary over time.
         """
-        full_action_dict = {name: self.agents[name].act(*outcome) for name, outcome in self._agents_outcome.items()}  # type: ignore
+        full_action_dict = {name: self.agents[name].act(*self._agents_outcome[name]) for name in self._agent_keys}  # type: ignore
         full_action_dict.update(action_dict)
-        outcomes, done = StepOutcome.from_multiagent_step(*self.env.step(full_action_dict))
-        self._agents_outcome = {name: outcomes[name] for name in self.agents}
-        return StepOutcome.to_multiagent_step({name: outcomes[name] for name in outcomes if name not in self.agents}, done)
+        obs, reward, done, info, done_all = self.env.step(full_action_dict)
+        StepOutcome.from_multiagent_step(obs, reward, done, info, done_all, keys=self._agent_keys, pool=self._agents_outcome)
+        # the returns of the other agents are selected in a single pass, without StepOutcome conversions
+        other_obs: Dict[str, Any] = {}
+        other_reward: Dict[str, Any] = {}
+        other_done: Dict[str, bool] = {}
+        other_info: Dict[str, Any] = {}
+        for name in self._other_keys:
+            if name not in obs:  # the agent does not play at this step
+                continue
+            other_obs[name] = obs[name]
+            other_reward[name] = reward.get(name, None)
+            other_done[name] = done.get(name, done_all)
+            other_info[name] = info.get(name, {})
+        return other_obs, other_reward, other_done, other_info, done_all
 
     def copy(self) -> "PartialMultiAgentEnv":
         return self.__class__(self.env, **self.agents)
 
     def as_single_agent(self) -> "SingleAgentEnv":
-        return SingleAgentEnv(self)
+        return _FusedSingleAgentEnv(self)
+
+
+class AutoResetEnv(MultiAgentEnv):
+    """Multi-agent environment which resets itself at the end of each episode (in a gym3-like fashion).
+    The step ending an episode returns its rewards and dones, but the observations of the first
+    step of the next episode. This is flagged by a "first" key in the info of each agent, while
+    the last observation of the finished episode is provided under the "terminal_observation" key.
+    """
+
+    def __init__(self, env: MultiAgentEnv) -> None:
+        self.env = env.copy()
+        self.agent_names = env.agent_names
+        self.observation_space = env.observation_space
+        self.action_space = env.action_space
+
+    def reset(self) -> Dict[str, Any]:
+        return self.env.reset()
+
+    def step(self, action_dict: Dict[str, Any]) -> StepReturn:
+        obs, reward, done, info, done_all = self.env.step(action_dict)
+        if done_all:
+            info = {name: dict(info.get(name, {}), first=True, terminal_observation=ob) for name, ob in obs.items()}
+            obs = self.env.reset()
+        return obs, reward, done, info, done_all
+
+    def copy(self) -> "AutoResetEnv":
+        return self.__class__(self.env)
 
 
 # pylint: disable=abstract-method
@@ -140,13 +303,134 @@ class SingleAgentEnv(gym.Env):  # type: ignore
 
     def step(self, action: Any) -> Tuple[Any, Any, bool, Dict[Any, Any]]:
         an = self._agent_name
-        obs, reward, done, info = self.env.step({an: action})
-        return obs[an], reward[an], done[an] | done["__all__"], info.get(an, {})
+        obs, reward, done, info, done_all = self.env.step({an: action})
+        return obs[an], reward[an], done[an] | done_all, info.get(an, {})
 
     def copy(self) -> "SingleAgentEnv":
         return self.__class__(self.env.copy())
 
 
+class _FusedSingleAgentEnv(SingleAgentEnv):
+    """SingleAgentEnv which directly plays the fixed agents and the underlying multi-agent
+    environment of its PartialMultiAgentEnv, without intermediate dicts nor StepOutcome instances.
+    """
+
+    def __init__(self, env: PartialMultiAgentEnv):
+        super().__init__(env)
+        self._fixed_agents = tuple(env.agents.items())
+        self._fixed_outcomes: Dict[str, Tuple[Any, Any, bool, Dict[Any, Any]]] = {}
+
+    def reset(self) -> Any:
+        obs = self.env.env.reset()
+        for name, _ in self._fixed_agents:
+            self._fixed_outcomes[name] = (obs[name], None, False, {})
+        return obs[self._agent_name]
+
+    def step(self, action: Any) -> Tuple[Any, Any, bool, Dict[Any, Any]]:
+        an = self._agent_name
+        fixed_outcomes = self._fixed_outcomes
+        actions = {an: action}
+        for name, agent in self._fixed_agents:
+            actions[name] = agent.act(*fixed_outcomes[name])
+        obs, reward, done, info, done_all = self.env.env.step(actions)
+        for name, _ in self._fixed_agents:
+            fixed_outcomes[name] = (obs[name], reward.get(name, None), done.get(name, done_all), info.get(name, {}))
+        return obs[an], reward.get(an, None), done.get(an, done_all) | done_all, info.get(an, {})
+
+
+class VectorizedEnv:
+    """Plays several copies of an environment in lockstep (in a gym3-like fashion).
+    Each copy is automatically reset at the end of an episode (see AutoResetEnv).
+
+    Parameters
+    ----------
+    env: gym.Env or MultiAgentEnv
+        the environment to replicate (it must implement a copy method)
+    num_envs: int
+        number of copies of the environment
+    asynchronous: bool
+        whether act_async steps the copies in a background thread (this is only beneficial
+        if the environment releases the GIL while stepping)
+    """
+
+    def __init__(self, env: Union[gym.Env, MultiAgentEnv], num_envs: int, asynchronous: bool = False) -> None:
+        self._is_gym = isinstance(env, gym.Env)
+        self.envs = [env.copy() if self._is_gym else AutoResetEnv(env) for _ in range(num_envs)]
+        self._outcomes: List[Dict[str, StepOutcome]] = [{} for _ in range(num_envs)]
+        self._firsts = np.zeros(num_envs, dtype=bool)
+        self.asynchronous = asynchronous
+        self._executor: Optional[ThreadPoolExecutor] = None  # created when needed, since close stops it
+        self._pending: Deque[Union[Future, Dict[int, Dict[str, Any]]]] = deque()
+
+    @property
+    def num_envs(self) -> int:
+        return len(self.envs)
+
+    def reset(self) -> None:
+        """Resets all copies (and discards pending actions)
+        """
+        self._pending.clear()
+        for index in range(self.num_envs):
+            self.reset_copy(index)
+
+    def reset_copy(self, index: int) -> None:
+        """Resets one copy
+        """
+        if self._is_gym:
+            self._outcomes[index] = {_SINGLE_AGENT_NAME: StepOutcome(self.envs[index].reset())}
+        else:
+            self._outcomes[index] = StepOutcome.from_multiagent_step(self.envs[index].reset(), {}, {}, {})[0]
+        self._firsts[index] = True
+
+    def observe(self) -> Tuple[List[Dict[str, StepOutcome]], np.ndarray]:
+        """Returns the current outcomes of each copy, and whether the copy started a new episode
+        (the rewards are then those of the last step of the finished episode)
+        """
+        return self._outcomes, self._firsts
+
+    def act(self, actions: Dict[int, Dict[str, Any]]) -> None:
+        """Steps the copies for which actions are provided (indexed by copy number)
+        """
+        for index, action_dict in actions.items():
+            env = self.envs[index]
+            if self._is_gym:
+                obs, reward, done, info = env.step(action_dict[_SINGLE_AGENT_NAME])
+                if done:
+                    info = dict(info, first=True, terminal_observation=obs)
+                    obs = env.reset()
+                self._outcomes[index] = {_SINGLE_AGENT_NAME: StepOutcome(obs, reward, done, info)}
+            else:
+                self._outcomes[index], done = StepOutcome.from_multiagent_step(*env.step(action_dict))
+            self._firsts[index] = done
+
+    def act_async(self, actions: Dict[int, Dict[str, Any]]) -> None:
+        """Starts stepping the copies for which actions are provided (in the same way as act).
+        The copies must not be observed or acted upon until the corresponding call to act_wait.
+        """
+        if not self.asynchronous:
+            self._pending.append(actions)
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending.append(self._executor.submit(self.act, actions))
+
+    def act_wait(self) -> None:
+        """Waits for the oldest call to act_async to finish
+        """
+        pending = self._pending.popleft()
+        if isinstance(pending, Future):
+            pending.result()
+        else:
+            self.act(pending)
+
+    def close(self) -> None:
+        """Stops the background thread (if any), which is restarted if needed
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
 class EnvironmentRunner:
     """Helper for running environements
 
@@ -158,12 +442,68 @@ class EnvironmentRunner:
         number of repetitions to play the environment (smoothes the output)
     max_step: int
         maximum number of steps to play the environemnet before breaking
+    batch_size: int
+        number of copies of the environment to play simultaneously. Above 1, the environment
+        must implement a copy method and the agents must not hold an internal state since
+        each of them plays all the copies at once (through its act_batch method).
+    pipeline: bool
+        requires batch_size above 1. If True, the copies of the environment are split into
+        two shards, and one shard steps in a background thread while the agents act on the other
+        (this is only beneficial if the environment releases the GIL while stepping).
+    num_workers: int
+        number of processes in which to play the repetitions. Above 1, copies of the environment
+        and of the agents are sent to a multiprocessing pool created at each run (this may not work
+        for all agents, eg: torch modules do not always fork cleanly). Each repetition is seeded from
+        numpy's global random state, and agents can seed their own generators through their seed method.
+    reuse: bool
+        requires batch_size above 1. If True, the copies of the environment are created
+        at the first run and only reset at the following ones (this avoids recreating environment
+        wrappers and their fixed agents at each run). The environment must then not be modified
+        between runs, since the copies would not be updated.
+    compiled: bool
+        if True, multi-agent environments and agents providing a compiled representation (through
+        _numba_tables and _numba_policy methods, see DoubleOSeven, RandomAgent and Agent007) are played
+        in a numba-compiled loop when numba is available. Agents overriding act without overriding
+        _numba_policy are played through act. This cannot be combined with batch_size or num_workers above 1.
+    soa: bool
+        if True, multi-agent environments with array observations in which all agents play are played
+        through a SoAStepBatch, which converts the step returns without StepOutcome instances. Agents
+        then receive copies of the observations, and the rewards as floats.
     """
 
-    def __init__(self, env: Union[gym.Env, MultiAgentEnv], num_repetitions: int = 1, max_step: float = float("inf")) -> None:
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        env: Union[gym.Env, MultiAgentEnv],
+        num_repetitions: int = 1,
+        max_step: float = float("inf"),
+        batch_size: int = 1,
+        pipeline: bool = False,
+        num_workers: int = 1,
+        reuse: bool = False,
+        compiled: bool = False,
+        soa: bool = False,
+    ) -> None:
+        if batch_size > 1 and num_workers > 1:
+            raise ValueError("batch_size and num_workers cannot be both above 1")
+        if pipeline and batch_size == 1:
+            raise ValueError("pipeline requires batch_size above 1")
+        if reuse and batch_size == 1:
+            raise ValueError("reuse requires batch_size above 1")
+        if compiled and (batch_size > 1 or num_workers > 1):
+            raise ValueError("compiled cannot be used with batch_size or num_workers above 1")
         self.env = env
         self.num_repetitions = num_repetitions
         self.max_step = max_step
+        self.batch_size = batch_size
+        self.pipeline = pipeline
+        self.num_workers = num_workers
+        self.reuse = reuse
+        self.compiled = compiled
+        self._venv: Optional[VectorizedEnv] = None
+        # environment type checks are performed once, and episodes are played by dedicated methods
+        self._is_gym = isinstance(env, gym.Env)
+        # agents of multi-agent environments share the same spaces, so array observations can be batched
+        self._soa = soa and not self._is_gym and isinstance(env.observation_space, gym.spaces.Box)
 
     def run(self, *agent: Agent, **agents: Agent) -> Union[float, Dict[str, float]]:
         """Run one agent or multiple named agents
@@ -180,44 +520,249 @@ class EnvironmentRunner:
         float:
             the mean reward (possibly for each agent)
         """
-        san = "single_agent_name"
-        sum_rewards: Dict[str, float] = {name: 0.0 for name in agents} if agents else {san: 0.0}
-        for _ in range(self.num_repetitions):
-            rewards = self._run_once(*agent, **agents)
-            for name, value in rewards.items():
-                sum_rewards[name] += value
+        san = _SINGLE_AGENT_NAME
+        if self._can_run_compiled(agents):
+            sum_rewards = self._run_compiled(**agents)
+        elif self.batch_size > 1:
+            sum_rewards = self._run_vectorized(*agent, **agents)
+        elif self.num_workers > 1:
+            sum_rewards = self._run_in_pool(*agent, **agents)
+        else:
+            sum_rewards = {name: 0.0 for name in agents} if agents else {san: 0.0}
+            for _ in range(self.num_repetitions):
+                rewards = self._run_once(*agent, **agents)
+                for name, value in rewards.items():
+                    sum_rewards[name] += value
         mean_rewards = {name: float(value) / self.num_repetitions for name, value in sum_rewards.items()}
-        if isinstance(self.env, gym.Env):
+        if self._is_gym:
             return mean_rewards[san]
         return mean_rewards
 
-    def _run_once(self, *single_agent: Agent, **agents: Agent) -> Dict[str, float]:
-        san = "single_agent_name"
+    @staticmethod
+    def _name_agents(*single_agent: Agent, **agents: Agent) -> Dict[str, Agent]:
         if len(single_agent) == 1 and not agents:
-            agents = {san: single_agent[0]}
+            return {_SINGLE_AGENT_NAME: single_agent[0]}
         elif single_agent or not agents:
             raise ValueError("Either provide 1 unnamed agent or several named agents")
+        return agents
+
+    def _run_once(self, *single_agent: Agent, **agents: Agent) -> Dict[str, float]:
+        agents = self._name_agents(*single_agent, **agents)
+        if self._is_gym:
+            return self._run_once_gym(agents[_SINGLE_AGENT_NAME])
+        if self._soa and set(agents) == set(self.env.agent_names):
+            return self._run_once_soa(agents)
+        return self._run_once_multi(agents)
+
+    def _run_once_gym(self, agent: Agent) -> Dict[str, float]:
+        """Plays one episode of a single-agent gym environment, keeping the step returns as local variables
+        """
+        agent.reset()
+        act = agent.act
+        env_step = self.env.step
+        obs = self.env.reset()
+        reward: Any = None  # no reward before the first step
+        done = False
+        info: Dict[Any, Any] = {}
+        reward_sum = 0.0
+        step = 0
+        while step < self.max_step and not done:
+            obs, reward, done, info = env_step(act(obs, reward, done, info))
+            reward_sum += reward
+            step += 1
+        if agent.needs_terminal_observation:
+            act(obs, reward, done, info)
+        return {_SINGLE_AGENT_NAME: float(reward_sum)}
+
+    def _run_once_multi(self, agents: Dict[str, Agent]) -> Dict[str, float]:
+        """Plays one episode of a multi-agent environment
+        """
         for agent in agents.values():
             agent.reset()
-        if isinstance(self.env, gym.Env):
-            outcomes, done = {san: StepOutcome(self.env.reset())}, False
-        else:
-            outcomes, done = StepOutcome.from_multiagent_step(self.env.reset(), {}, {}, {})
-        reward_sum: Dict[str, float] = defaultdict(float)
+        outcomes, done = StepOutcome.from_multiagent_step(self.env.reset(), {}, {}, {})
+        names = tuple(agents)
+        indices = {name: k for k, name in enumerate(names)}
+        reward_sum = np.zeros(len(names), dtype=np.float64)
         step = 0
         while step < self.max_step and not done:
             actions: Dict[str, Any] = {}
             for name, outcome in outcomes.items():
                 actions[name] = agents[name].act(*outcome)  # type: ignore
-            if isinstance(self.env, gym.Env):
-                outcomes = {san: StepOutcome(*self.env.step(actions[san]))}
-                done = outcomes[san].done
-            else:
-                outcomes, done = StepOutcome.from_multiagent_step(*self.env.step(actions))
+            outcomes, done = StepOutcome.from_multiagent_step(*self.env.step(actions), pool=outcomes)
             for name, outcome in outcomes.items():
                 assert outcome.reward is not None
-                reward_sum[name] += outcome.reward
+                reward_sum[indices[name]] += outcome.reward
             step += 1
         for name, outcome in outcomes.items():
-            agents[name].act(*outcome)  # type: ignore
-        return reward_sum
+            agent = agents[name]
+            if agent.needs_terminal_observation:
+                agent.act(*outcome)  # type: ignore
+        return {name: float(reward_sum[k]) for k, name in enumerate(names)}
+
+    def _run_once_soa(self, agents: Dict[str, Agent]) -> Dict[str, float]:
+        """Plays one episode of a multi-agent environment in which all agents have the same
+        array observations, using a SoAStepBatch. Agents receive copies of the observations (the
+        arrays are overwritten at the next step) and Python scalars.
+        """
+        names = tuple(self.env.agent_names)
+        ordered_agents = [agents[name] for name in names]
+        for agent in ordered_agents:
+            agent.reset()
+        batch = SoAStepBatch(names, self.env.observation_space)
+        done = batch.from_multiagent_step(self.env.reset(), {}, {}, {})
+        rewards: List[Any] = [None for _ in names]  # no reward before the first step
+        dones = [False for _ in names]
+        reward_sum = np.zeros(len(names))
+        step = 0
+        while step < self.max_step and not done:
+            actions = {
+                name: agent.act(batch.observation[k].copy(), rewards[k], dones[k], batch.info[k])
+                for k, (name, agent) in enumerate(zip(names, ordered_agents))
+            }
+            done = batch.from_multiagent_step(*self.env.step(actions))
+            np.add(reward_sum, batch.reward, out=reward_sum)
+            rewards = batch.reward.tolist()
+            dones = batch.done.tolist()
+            step += 1
+        for k, agent in enumerate(ordered_agents):
+            if agent.needs_terminal_observation:
+                agent.act(batch.observation[k].copy(), rewards[k], dones[k], batch.info[k])
+        return {name: float(value) for name, value in zip(names, reward_sum)}
+
+    def _run_vectorized(self, *single_agent: Agent, **agents: Agent) -> Dict[str, float]:
+        """Plays all repetitions on automatically reset copies of the environment, and returns the sum of the rewards
+        """
+        agents = self._name_agents(*single_agent, **agents)
+        for agent in agents.values():
+            agent.reset()
+        names = tuple(agents)
+        indices = {name: k for k, name in enumerate(names)}
+        num_envs = min(self.batch_size, self.num_repetitions)
+        venv = self._venv
+        if venv is None or venv.num_envs != num_envs:  # the copies are recreated if num_repetitions changed
+            venv = VectorizedEnv(self.env, num_envs, asynchronous=self.pipeline)
+            if self.reuse:
+                self._venv = venv
+        lanes = list(range(venv.num_envs))
+        # while a shard of copies is stepping, the agents can act on the other one
+        shards = [lanes[::2], lanes[1::2]] if self.pipeline and venv.num_envs > 1 else [lanes]
+        pending = [False for _ in shards]
+        lane_rewards = np.zeros((len(names), venv.num_envs))
+        lane_steps = np.zeros(venv.num_envs, dtype=int)
+        reward_sum = np.zeros(len(names))
+        episodes_started = venv.num_envs
+        episodes_completed = 0
+        venv.reset()
+        try:
+            while episodes_completed < self.num_repetitions:
+                for index, shard in enumerate(shards):
+                    if pending[index]:
+                        venv.act_wait()
+                        outcomes, firsts = venv.observe()
+                        for lane in list(shard):
+                            for name, outcome in outcomes[lane].items():
+                                assert outcome.reward is not None
+                                lane_rewards[indices[name], lane] += outcome.reward
+                            lane_steps[lane] += 1
+                            if firsts[lane] or lane_steps[lane] >= self.max_step:
+                                episodes_completed += 1
+                                reward_sum += lane_rewards[:, lane]
+                                lane_rewards[:, lane] = 0
+                                lane_steps[lane] = 0
+                                if episodes_started < self.num_repetitions:
+                                    episodes_started += 1
+                                    if not firsts[lane]:  # interrupted episode, which was not automatically reset
+                                        venv.reset_copy(lane)
+                                else:
+                                    shard.remove(lane)
+                    venv.act_async(self._act_batch(agents, venv.observe()[0], shard))
+                    pending[index] = True
+        finally:
+            venv.close()
+        return {name: float(value) for name, value in zip(names, reward_sum)}
+
+    @staticmethod
+    def _act_batch(agents: Dict[str, Agent], outcomes: List[Dict[str, StepOutcome]], lanes: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Computes the actions of all agents on the provided copies of the environment
+        """
+        actions: Dict[int, Dict[str, Any]] = {lane: {} for lane in lanes}
+        for name, agent in agents.items():
+            playing = [lane for lane in lanes if name in outcomes[lane]]
+            if playing:
+                batch = [outcomes[lane][name] for lane in playing]
+                observations: Any = [o.observation for o in batch]
+                if isinstance(observations[0], np.ndarray):
+                    observations = np.stack(observations)  # stacked once for agents processing the whole batch
+                rewards = [o.reward for o in batch]
+                dones = [o.done for o in batch]
+                infos = [o.info for o in batch]
+                for lane, action in zip(playing, agent.act_batch(observations, rewards, dones, infos)):
+                    actions[lane][name] = action
+        return actions
+
+    def _can_run_compiled(self, agents: Dict[str, Agent]) -> bool:
+        """Whether the environment and the agents provide a compiled representation
+        """
+        return (
+            self.compiled
+            and _fast_runner.NUMBA_AVAILABLE
+            and isinstance(self.env, MultiAgentEnv)
+            and getattr(self.env, "_numba_tables", lambda: None)() is not None
+            and set(agents) == set(self.env.agent_names)
+            and all(_has_numba_policy(agent) for agent in agents.values())
+        )
+
+    def _run_compiled(self, **agents: Agent) -> Dict[str, float]:
+        """Plays all repetitions through the compiled fast path, and returns the sum of the rewards
+        """
+        assert isinstance(self.env, MultiAgentEnv)
+        # pylint: disable=protected-access
+        transition, encode, initial_state, observations = self.env._numba_tables()  # type: ignore
+        names = self.env.agent_names
+        policies = np.array([agents[name]._numba_policy(observations) for name in names])  # type: ignore
+        seed = np.random.randint(2**32, dtype=np.uint32)  # so that seeding numpy's global random state reproduces the results
+        rewards = _fast_runner.run_episodes(
+            transition, encode, initial_state, np.cumsum(policies, axis=2), float(self.max_step), self.num_repetitions, seed
+        )
+        return {name: float(value) for name, value in zip(names, rewards)}
+
+    def _run_in_pool(self, *single_agent: Agent, **agents: Agent) -> Dict[str, float]:
+        """Plays all repetitions in a multiprocessing pool, and returns the sum of the rewards
+        """
+        agents = self._name_agents(*single_agent, **agents)
+        runner = EnvironmentRunner(self.env.copy(), max_step=self.max_step, soa=self._soa)
+        agent_copies = {name: agent.copy() for name, agent in agents.items()}
+        # each repetition is seeded from the driver's random state, so that seeded runs can be reproduced
+        seeds = np.random.randint(2**32, size=self.num_repetitions, dtype=np.uint32).tolist()
+        with multiprocessing.Pool(self.num_workers, initializer=_init_worker, initargs=(runner, agent_copies)) as pool:
+            all_rewards = pool.map(_run_once_worker, seeds)
+        return {name: sum(rewards[name] for rewards in all_rewards) for name in agents}
+
+
+def _has_numba_policy(agent: Agent) -> bool:
+    """Whether the agent has a _numba_policy method mirroring its act method, ie: both are
+    defined by the same class (a subclass overriding act would otherwise inherit an outdated policy)
+    """
+    mro = type(agent).__mro__
+    act_owner = next(cls for cls in mro if "act" in cls.__dict__)
+    return any(cls is act_owner for cls in mro if "_numba_policy" in cls.__dict__)
+
+
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _init_worker(runner: EnvironmentRunner, agents: Dict[str, Agent]) -> None:
+    """Stores the runner and agents of a pool worker
+    """
+    _WORKER_STATE.update(runner=runner, agents=agents)
+
+
+def _run_once_worker(seed: int) -> Dict[str, float]:
+    """Plays one repetition in a pool worker, after seeding all random generators
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+    agents = _WORKER_STATE["agents"]
+    for agent in agents.values():
+        agent.seed(seed)
+    return _WORKER_STATE["runner"]._run_once(**agents)  # type: ignore  # pylint: disable=protected-access
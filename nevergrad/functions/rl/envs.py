@@ -1,7 +1,8 @@
-from typing import Dict, Tuple, Any, List
+from typing import Dict, Tuple, Any, List, Optional, Callable
 import numpy as np
 import gym
 from . import base
+from ._fast_runner import njit
 
 
 class JamesBond:
@@ -86,9 +87,10 @@ class DoubleOSeven(base.MultiAgentEnv):
             obs (dict): New observations for each ready agent.
             rewards (dict): Reward values for each ready agent. If the
                 episode is just started, the value will be None.
-            dones (dict): Done values for each ready agent. The special key
-                "__all__" (required) is used to indicate env termination.
+            dones (dict): Done values for each ready agent (defaults to the global done value
+                for missing agents).
             infos (dict): Optional info values for each agent id.
+            done (bool): Whether the environment is terminated.
         """
         if self.verbose:
             strings: List[str] = []
@@ -118,5 +120,66 @@ class DoubleOSeven(base.MultiAgentEnv):
                 rew = {"player_0": 1, "player_1": 0}
             # if both keep protecting... well, it goes on...
         obs = self._make_observations()
-        done = {"__all__": self._step == 100 or sum(abs(x) for x in rew.values()) > 0}
-        return obs, rew, done, info
+        done = self._step == 100 or sum(abs(x) for x in rew.values()) > 0
+        return obs, rew, {}, info, done
+
+    def _numba_tables(self) -> Optional[Tuple[Callable[..., bool], Callable[..., int], np.ndarray, np.ndarray]]:
+        """Compiled representation of the game for the fast path of the EnvironmentRunner
+        (not available in verbose mode).
+        The state is the array (ammunitions_0, consecutive_protect_0, ammunitions_1, consecutive_protect_1, step).
+        Observations are encoded with ammunitions capped to 1 and consecutive protections capped
+        to 5, so policies must only depend on whether a player has ammunitions.
+
+        Returns
+        -------
+        callable:
+            the transition function
+        callable:
+            the observation encoding function
+        np.ndarray:
+            the initial state
+        np.ndarray:
+            one observation representing each encoded observation (in order)
+        """
+        if self.verbose:
+            return None
+        observations = np.indices((2, 6, 2, 6)).reshape(4, -1).T
+        return _doubleoseven_transition, _doubleoseven_encode, np.zeros(5, dtype=np.int64), observations
+
+
+_MAX_CONSECUTIVE_PROTECT = JamesBond.max_consecutive_protect  # module constant for compilation
+
+
+@njit(cache=True)  # type: ignore
+def _doubleoseven_transition(state: np.ndarray, actions: np.ndarray, rewards: np.ndarray) -> bool:
+    """Compiled version of DoubleOSeven.step (actions 0, 1 and 2 are respectively fire, protect and reload)
+    """
+    state[4] += 1
+    rewards[:] = 0
+    played = actions.copy()
+    for k in range(2):
+        if played[k] == 0 and not state[2 * k]:
+            played[k] = 2  # fire without ammunitions is converted to reload
+        if played[k] == 0:
+            state[2 * k] -= 1
+        elif played[k] == 2:
+            state[2 * k] += 1
+        state[2 * k + 1] = state[2 * k + 1] + 1 if played[k] == 1 else 0
+    if played[0] == 0 and played[1] == 2:
+        rewards[0] = 1
+    elif played[0] == 2 and played[1] == 0:
+        rewards[1] = 1
+    if max(state[1], state[3]) > _MAX_CONSECUTIVE_PROTECT:
+        if state[1] > state[3]:
+            rewards[0], rewards[1] = 0, 1
+        elif state[3] > state[1]:
+            rewards[0], rewards[1] = 1, 0
+    return bool(state[4] == 100 or rewards[0] + rewards[1] > 0)
+
+
+@njit(cache=True)  # type: ignore
+def _doubleoseven_encode(state: np.ndarray, player: int) -> int:
+    """Index of the encoded observation of a player (see DoubleOSeven._numba_tables)
+    """
+    me, other = 2 * player, 2 - 2 * player
+    return ((min(state[me], 1) * 6 + min(state[me + 1], 5)) * 2 + min(state[other], 1)) * 6 + min(state[other + 1], 5)  # type: ignore
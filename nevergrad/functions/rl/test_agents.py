@@ -1,7 +1,12 @@
+from typing import Any, Dict, List, Optional
+import pytest
+import numpy as np
+from nevergrad.common import testing
 from nevergrad.optimization import optimizerlib
 from . import agents
 from . import envs
 from . import base
+from . import _fast_runner
 
 
 def test_play_environment() -> None:
@@ -14,6 +19,30 @@ def test_play_environment() -> None:
     assert sum(rewards.values()) in [0, 1]
 
 
+def test_play_compiled_environment() -> None:
+    mgame = envs.DoubleOSeven()
+    player_0 = agents.Agent007(mgame)
+    player_1 = agents.RandomAgent(mgame)
+    assert not base.EnvironmentRunner(mgame)._can_run_compiled({"player_0": player_0, "player_1": player_1})
+    runner = base.EnvironmentRunner(mgame, num_repetitions=10, compiled=True)
+    assert runner._can_run_compiled({"player_0": player_0, "player_1": player_1}) == _fast_runner.NUMBA_AVAILABLE
+    rewards = runner.run(player_1=player_1, player_0=player_0)
+    assert isinstance(rewards, dict)
+    assert 0 <= sum(rewards.values()) <= 1
+    results = []
+    for _ in range(2):
+        np.random.seed(12)
+        results.append(runner.run(player_1=player_1, player_0=player_0))
+    assert results[0] == results[1]
+    # subclasses overriding act are played through act
+    protecting = _ProtectingAgent(mgame)
+    players: Dict[str, base.Agent] = {"player_0": protecting, "player_1": _ProtectingAgent(mgame)}
+    assert not runner._can_run_compiled(players)
+    rewards = runner.run(**players)
+    assert rewards == {"player_0": 0, "player_1": 0}
+    assert protecting.num_calls > 0
+
+
 def test_play_single_agent_environment() -> None:
     mgame = envs.DoubleOSeven()
     game = mgame.with_agent(player_1=agents.RandomAgent(mgame)).as_single_agent()
@@ -24,6 +53,164 @@ def test_play_single_agent_environment() -> None:
     assert reward in [0, 1]
 
 
+class _CountingAgent(agents.RandomAgent):
+
+    def __init__(self, env: Any) -> None:
+        super().__init__(env)
+        self.num_calls = 0
+
+    def act(self, observation: Any, reward: Any, done: bool, info: Optional[Dict[Any, Any]] = None) -> Any:
+        self.num_calls += 1
+        return super().act(observation, reward, done, info)
+
+
+class _TerminalCountingAgent(_CountingAgent):
+
+    needs_terminal_observation = True
+
+
+class _ProtectingAgent(_CountingAgent):
+
+    def act(self, observation: Any, reward: Any, done: bool, info: Optional[Dict[Any, Any]] = None) -> Any:
+        self.num_calls += 1
+        return envs.JamesBond.actions.index("protect")
+
+
+class _ReloadingAgent(base.Agent):
+
+    def __init__(self) -> None:
+        self.history: List[Any] = []
+
+    def act(self, observation: Any, reward: Any, done: bool, info: Optional[Dict[Any, Any]] = None) -> Any:
+        self.history.append((observation, reward, done))
+        return envs.JamesBond.actions.index("reload")
+
+
+def test_soa_run_outcomes() -> None:
+    mgame = envs.DoubleOSeven()
+    runner = base.EnvironmentRunner(mgame, max_step=3, soa=True)
+    players = {name: _ReloadingAgent() for name in mgame.agent_names}
+    runner.run(**players)
+    history = players["player_0"].history
+    np.testing.assert_array_equal([h[0] for h in history], [[0, 0, 0, 0], [1, 0, 1, 0], [2, 0, 2, 0]])
+    assert [type(h[1]) for h in history[1:]] == [float, float]
+    assert [type(h[2]) for h in history] == [bool, bool, bool]
+
+
+class _SeededRandomAgent(base.Agent):
+
+    def __init__(self, seed: int) -> None:
+        self._seed = seed
+        self.rng = np.random.RandomState(seed)
+
+    def act(self, observation: Any, reward: Any, done: bool, info: Optional[Dict[Any, Any]] = None) -> Any:
+        return self.rng.randint(3)
+
+    def copy(self) -> "_SeededRandomAgent":
+        return self.__class__(self._seed)
+
+
+def test_soa_and_multi_runs_match() -> None:
+    mgame = envs.DoubleOSeven()
+    results = []
+    for soa in [False, True]:
+        runner = base.EnvironmentRunner(mgame, num_repetitions=20, soa=soa)
+        assert runner._soa == soa  # run dispatches to _run_once_soa only if requested
+        players: Dict[str, base.Agent] = {"player_0": _SeededRandomAgent(1), "player_1": _SeededRandomAgent(2)}
+        method = runner._run_once_soa if soa else runner._run_once_multi
+        results.append([method(players) for _ in range(runner.num_repetitions)])
+    assert results[0] == results[1]
+    assert len(set(r["player_0"] for r in results[0])) > 1  # not trivially equal
+
+
+def test_terminal_observation() -> None:
+    mgame = envs.DoubleOSeven()
+    game = mgame.with_agent(player_1=agents.RandomAgent(mgame)).as_single_agent()
+    runner = base.EnvironmentRunner(game, max_step=1)  # the game cannot end at the first step
+    for agent_class, expected in [(_CountingAgent, 1), (_TerminalCountingAgent, 2)]:
+        agent = agent_class(game)
+        runner.run(agent)
+        assert agent.num_calls == expected
+
+
+class _FiringAgent(base.Agent):
+
+    def act(self, observation: Any, reward: Any, done: bool, info: Optional[Dict[Any, Any]] = None) -> Any:
+        return envs.JamesBond.actions.index("fire" if observation[0] else "reload")
+
+
+@testing.parametrized(
+    interrupted=(False, 1),
+    finished=(False, 3),
+    interrupted_pipeline=(True, 1),
+    finished_pipeline=(True, 3),
+)
+def test_vectorized_run_matches_serial(pipeline: bool, max_step: int) -> None:
+    mgame = envs.DoubleOSeven()
+    players = {"player_0": _FiringAgent(), "player_1": _ReloadingAgent()}  # player_0 wins at the second step
+    expected = base.EnvironmentRunner(mgame, num_repetitions=5, max_step=max_step).run(**players)
+    assert expected == {"player_0": float(max_step > 1), "player_1": 0}
+    runner = base.EnvironmentRunner(mgame, num_repetitions=5, max_step=max_step, batch_size=3, pipeline=pipeline)
+    assert runner.run(**players) == expected
+
+
+def test_vectorized_run_reuse() -> None:
+    mgame = envs.DoubleOSeven()
+    players = {"player_0": _FiringAgent(), "player_1": _ReloadingAgent()}
+    runner = base.EnvironmentRunner(mgame, num_repetitions=8, batch_size=8, reuse=True)
+    for num_repetitions in [8, 1, 8, 3]:  # fewer repetitions than cached copies must not be over-counted
+        runner.num_repetitions = num_repetitions
+        assert runner.run(**players) == {"player_0": 1, "player_1": 0}
+
+
+def test_runner_option_conflicts() -> None:
+    mgame = envs.DoubleOSeven()
+    conflicts = [
+        dict(batch_size=2, num_workers=2),
+        dict(pipeline=True),
+        dict(reuse=True),
+        dict(compiled=True, batch_size=2),
+        dict(compiled=True, num_workers=2),
+    ]
+    for kwargs in conflicts:
+        with pytest.raises(ValueError):
+            base.EnvironmentRunner(mgame, **kwargs)  # type: ignore
+
+
+def test_vectorized_run() -> None:
+    mgame = envs.DoubleOSeven()
+    runner = base.EnvironmentRunner(mgame, num_repetitions=5, batch_size=2)
+    rewards = runner.run(player_0=agents.Agent007(mgame), player_1=agents.RandomAgent(mgame))
+    assert isinstance(rewards, dict)
+    assert 0 <= sum(rewards.values()) <= 1
+    game = mgame.with_agent(player_1=agents.RandomAgent(mgame)).as_single_agent()
+    for pipeline in [False, True]:
+        runner = base.EnvironmentRunner(game, num_repetitions=5, batch_size=3, pipeline=pipeline, reuse=True)
+        for _ in range(2):  # second run reuses the copies of the environment
+            reward = runner.run(agents.RandomAgent(game))
+            assert isinstance(reward, float)
+            assert 0 <= reward <= 1
+
+
+def test_run_in_pool() -> None:
+    mgame = envs.DoubleOSeven()
+    runner = base.EnvironmentRunner(mgame, num_repetitions=4, num_workers=2)
+    rewards = runner.run(player_0=agents.Agent007(mgame), player_1=agents.RandomAgent(mgame))
+    assert isinstance(rewards, dict)
+    assert 0 <= sum(rewards.values()) <= 1
+    runner = base.EnvironmentRunner(mgame, num_repetitions=4, num_workers=2, soa=True)
+    assert runner.run(player_0=_FiringAgent(), player_1=_ReloadingAgent()) == {"player_0": 1, "player_1": 0}
+    # seeded runs are reproducible, including torch sampling
+    game = mgame.with_agent(player_1=agents.RandomAgent(mgame)).as_single_agent()
+    agent = agents.TorchAgent.from_module_maker(game, agents.DenseNet, deterministic=False)
+    runner = base.EnvironmentRunner(game, num_repetitions=8, num_workers=2)
+    results = []
+    for _ in range(2):
+        np.random.seed(12)
+        results.append(runner.run(agent))
+    assert results[0] == results[1]
+
+
 def test_torch_agent() -> None:
     mgame = envs.DoubleOSeven()
     game = mgame.with_agent(player_1=agents.RandomAgent(mgame)).as_single_agent()
@@ -33,6 +220,15 @@ def test_torch_agent() -> None:
     assert output in game.action_space
 
 
+def test_torch_agent_act_batch() -> None:
+    mgame = envs.DoubleOSeven()
+    game = mgame.with_agent(player_1=agents.RandomAgent(mgame)).as_single_agent()
+    agent = agents.TorchAgent.from_module_maker(game, agents.DenseNet)
+    observations = np.random.randint(0, 5, size=(6, 4))
+    outputs = agent.act_batch(observations, [0.0] * 6, [False] * 6, [{}] * 6)
+    assert outputs == [agent.act(obs, 0.0, False, None) for obs in observations]
+
+
 def test_torch_agent_function() -> None:
     mgame = envs.DoubleOSeven()
     game = mgame.with_agent(player_1=agents.RandomAgent(mgame)).as_single_agent()
@@ -3,6 +3,8 @@ import pytest
 import numpy as np
 from nevergrad.common import testing
 from . import envs
+from . import base
+from . import agents
 
 
 def test_player() -> None:
@@ -58,10 +60,87 @@ def test_doubleoseven(base_sequence: List[Tuple[str, str]], base_expected: Dict[
         game.reset()
         for k, actions in enumerate(sequence):
             actions_dict = {f"player_{k}": envs.JamesBond.actions.index(a) for k, a in enumerate(actions)}
-            _, rew, done, _ = game.step(actions_dict)
-            if k != len(sequence) - 1 and done["__all__"]:
+            _, rew, _, _, done = game.step(actions_dict)
+            if k != len(sequence) - 1 and done:
                 raise AssertionError(f"The game should not have finished at step {k} with actions {actions} ({case})")
-        if not done["__all__"]:
+        if not done:
             # pylint: disable=undefined-loop-variable
             raise AssertionError(f"The game should have finished at last step with actions {actions} ({case})")
         assert rew == expected, f"Wrong output for case: {case}"
+
+
+def test_auto_reset_env() -> None:
+    game = base.AutoResetEnv(envs.DoubleOSeven())
+    game.reset()
+    actions = {"player_0": 2, "player_1": 2}
+    game.step(actions)  # both reload
+    obs, rew, _, info, done = game.step({"player_0": 0, "player_1": 2})  # player_0 fires and wins
+    assert done
+    assert rew == {"player_0": 1, "player_1": 0}
+    assert info["player_0"]["first"]
+    np.testing.assert_array_equal(info["player_0"]["terminal_observation"], [0, 0, 2, 0])
+    np.testing.assert_array_equal(obs["player_0"], [0, 0, 0, 0])  # new episode
+
+
+def test_doubleoseven_numba_transition() -> None:
+    game = envs.DoubleOSeven()
+    tables = game._numba_tables()
+    assert tables is not None
+    transition, encode, initial_state, observations = tables
+    np.random.seed(12)
+    for _ in range(20):
+        obs = game.reset()
+        state = initial_state.copy()
+        rewards = np.zeros(2)
+        done = False
+        while not done:
+            actions = np.random.randint(3, size=2)
+            obs, rew, _, _, expected_done = game.step({f"player_{k}": a for k, a in enumerate(actions)})
+            done = transition(state, actions, rewards)
+            assert done == expected_done
+            np.testing.assert_array_equal(rewards, [rew["player_0"], rew["player_1"]])
+            np.testing.assert_array_equal(state[:4], obs["player_0"])
+            for k in range(2):
+                expected = np.minimum(obs[f"player_{k}"], [1, 5, 1, 5])
+                np.testing.assert_array_equal(observations[encode(state, k)], expected)
+
+
+def test_step_outcome_pool() -> None:
+    pool = {"player_0": base.StepOutcome(0), "player_2": base.StepOutcome(2)}
+    first = pool["player_0"]
+    outcomes, done = base.StepOutcome.from_multiagent_step({"player_0": 3, "player_1": 4}, {"player_0": 1}, {}, {}, True, pool=pool)
+    assert outcomes is pool
+    assert done
+    assert outcomes["player_0"] is first
+    assert set(outcomes) == {"player_0", "player_1"}
+    assert tuple(first) == (3, 1, True, {})
+
+
+def test_fused_single_agent_env() -> None:
+    partial = envs.DoubleOSeven().with_agent(player_1=agents.Agent007(envs.DoubleOSeven()))
+    fused = partial.as_single_agent()
+    standard = base.SingleAgentEnv(partial.copy())
+    assert isinstance(fused, base._FusedSingleAgentEnv)
+    for seed in range(5):
+        outputs = []
+        for game in [fused, standard]:
+            np.random.seed(seed)
+            game.reset()
+            outputs.append([game.step(k % 3) for k in range(8)])
+        for fused_output, standard_output in zip(*outputs):
+            np.testing.assert_array_equal(fused_output[0], standard_output[0])
+            assert fused_output[1:] == standard_output[1:]
+
+
+def test_soa_step_batch() -> None:
+    game = envs.DoubleOSeven()
+    batch = base.SoAStepBatch(("player_1", "player_0"), game.observation_space)
+    game.reset()
+    step_return = game.step({"player_0": 2, "player_1": 1})  # p0 reloads and p1 protects
+    assert not batch.from_multiagent_step(*step_return)
+    np.testing.assert_array_equal(batch.observation, [[0, 1, 1, 0], [1, 0, 0, 1]])
+    obs, rew, done, _, done_all = batch.to_multiagent_step()
+    np.testing.assert_array_equal(obs["player_0"], [1, 0, 0, 1])
+    assert rew == {"player_0": 0, "player_1": 0}
+    assert done == {"player_0": False, "player_1": False}
+    assert not done_all